@@ -0,0 +1,198 @@
+"""Benchmark das etapas de análise do dashboard, executado fora do Streamlit.
+
+Uso:
+    python benchmark.py                                  # 10k, 100k, 1M e 10M linhas
+    python benchmark.py --linhas 10000 100000 --salvar benchmark_base.json
+    python benchmark.py --comparar benchmark_base.json   # aponta regressões contra a base
+
+Para cada tamanho de dataset sintético (gerado por gerar_dados.py) mede
+tempo de parede, pico de memória (tracemalloc) e bytes de payload de cada etapa:
+o tamanho serializado do resultado (o que o cache do Streamlit guardaria) ou, nas
+figuras, o JSON enviado ao navegador.
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# O app é importado em "bare mode": os comandos do Streamlit viram no-ops;
+# os avisos de "missing ScriptRunContext" de cada chamada são silenciados
+logging.disable(logging.WARNING)
+import app
+import gerar_dados
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000, 10_000_000]
+# O Excel aceita até 1.048.576 linhas por planilha, mas gravar e ler planilhas acima de 100 mil linhas
+# leva minutos: acima deste limite as cargas usam Parquet
+LIMITE_EXCEL = 100_000
+
+# Função para medir uma etapa: tempo (melhor de `repeticoes`), pico de memória e payload
+def medir(funcao, repeticoes=1, payload=None, memoria=True):
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    # O rastreamento do tracemalloc deixa o código Python bem mais lento: memória medida em uma execução à parte
+    pico = None
+    if memoria:
+        tracemalloc.start()
+        funcao()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return resultado, {'segundos': min(tempos), 'pico_bytes': pico, 'payload_bytes': (payload or _bytes_pickle)(resultado)}
+
+
+# Função auxiliar: bytes do resultado serializado (o que st.cache_data guardaria)
+def _bytes_pickle(resultado):
+    try:
+        return len(pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+# Função auxiliar: bytes de JSON das figuras (o que o navegador recebe)
+def _bytes_figuras(figuras):
+    return sum(len(fig.to_json()) for fig in figuras)
+
+
+# Função para montar as figuras da página a partir dos agregados
+def construir_figuras(agregados):
+    return [
+        app.figura_histograma_agregado(*agregados['histograma'], "Distribuição dos Valores dos Pedidos", '#F3DCF3'),
+        app.figura_boxplot_agregado(agregados['caixas']['valores'], "Boxplot dos Valores dos Pedidos", '', ["#593A61"]),
+        app.figura_top_categorias(agregados['vendas_categoria'].head(10), "Top 10 Categorias por Quantidade", 'Quantidade de Vendas', '#F3DCF3'),
+        app.figura_top_categorias(agregados['receita_categoria'].head(10), "Top 10 Categorias por Receita", 'Receita Total (R$)', '#593A61'),
+        app.figura_status_pedidos(agregados['status_pedidos']),
+        app.figura_intervalo_confianca(agregados['ic_95'], 0.95),
+        app.figura_boxplot_agregado(agregados['caixas']['b2b'], "Comparação B2B vs B2C", 'Tipo de Venda', ['#e74c3c', '#3498db']),
+        app.figura_boxplot_agregado(agregados['caixas']['promo'], "Comparação: Com vs Sem Promoção", 'Tem Promoção', ['#e74c3c', '#3498db']),
+    ]
+
+
+# Função para rodar todas as etapas em um tamanho de dataset
+def rodar_tamanho(n, pasta, repeticoes=1, semente=0, memoria=True):
+    etapas = {}
+
+    # Carga: Excel (como o dashboard lê hoje) até o limite, Parquet acima dele
+    if n <= LIMITE_EXCEL:
+        caminho = os.path.join(pasta, f'pedidos_{n}.xlsx')
+        gerar_dados.gravar_pedidos(caminho, n, semente=semente)
+        df, etapas['carga_excel'] = medir(lambda: app.preparar_dados(pd.read_excel(caminho)), 1, memoria=memoria)
+        # Snapshot: a primeira chamada grava o Parquet, a segunda só o lê
+        _, etapas['carga_snapshot_fria'] = medir(lambda: app.carregar_snapshot(caminho), 1, memoria=False)
+        _, etapas['carga_snapshot_quente'] = medir(lambda: app.carregar_snapshot(caminho), repeticoes, memoria=memoria)
+    else:
+        caminho = os.path.join(pasta, f'pedidos_{n}.parquet')
+        gerar_dados.gravar_pedidos(caminho, n, semente=semente)
+        df, etapas['carga_parquet'] = medir(lambda: app.preparar_dados(pd.read_parquet(caminho)), repeticoes, memoria=memoria)
+
+    # load_data, como a página chama: a primeira chamada da versão lê a fonte, as seguintes
+    # (reruns e outras sessões) recebem o mesmo DataFrame da memória, sem cópia nem serialização (payload 0)
+    fonte = app.abrir_fonte(caminho)
+    app._dados_em_memoria().update(versao=None, df=None)
+    _, etapas['load_data_fria'] = medir(lambda: app.load_data(fonte.versao(), fonte), 1, memoria=False)
+    _, etapas['load_data_quente'] = medir(lambda: app.load_data(fonte.versao(), fonte), repeticoes, memoria=memoria,
+                                          payload=lambda resultado: 0)
+    app._dados_em_memoria().update(versao=None, df=None)
+
+    valores = df['Valor_Pedido_BRL'].dropna()
+    mascaras = app._mascaras_grupos(df)
+    grupo_b2b = df.loc[mascaras['b2b'], 'Valor_Pedido_BRL'].dropna()
+    grupo_b2c = df.loc[mascaras['b2c'], 'Valor_Pedido_BRL'].dropna()
+
+    _, etapas['calcular_estatisticas'] = medir(lambda: app.calcular_estatisticas(valores), repeticoes, memoria=memoria)
+    _, etapas['calcular_ic'] = medir(lambda: app.calcular_ic(valores, 0.95), repeticoes, memoria=memoria)
+    _, etapas['teste_t_independente'] = medir(lambda: app.teste_t_independente(grupo_b2b, grupo_b2c), repeticoes, memoria=memoria)
+    agregados, etapas['calcular_agregados'] = medir(lambda: app.calcular_agregados(df), repeticoes, memoria=memoria)
+    _, etapas['figuras'] = medir(lambda: construir_figuras(agregados), repeticoes, payload=_bytes_figuras, memoria=memoria)
+    return etapas
+
+
+# Função para comparar uma execução com a base salva
+def comparar(resultados, base, tolerancia=0.2):
+    """Lista as etapas cujo tempo piorou mais que `tolerancia` (fração) em relação à base"""
+    regressoes = []
+    for tamanho, etapas in resultados.items():
+        for etapa, medida in etapas.items():
+            anterior = base.get(tamanho, {}).get(etapa)
+            if anterior and anterior['segundos'] > 0:
+                razao = medida['segundos'] / anterior['segundos']
+                if razao > 1 + tolerancia:
+                    regressoes.append((tamanho, etapa, anterior['segundos'], medida['segundos'], razao))
+    return regressoes
+
+
+def _formatar_bytes(n):
+    for unidade in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unidade == 'GB':
+            return f"{n:.0f} {unidade}" if unidade == 'B' else f"{n:.1f} {unidade}"
+        n /= 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas de análise do dashboard")
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO, help="tamanhos dos datasets sintéticos")
+    parser.add_argument('--repeticoes', type=int, default=3, help="repetições por etapa (vale o menor tempo)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--sem-memoria', action='store_true', help="não mede o pico de memória (evita a execução extra com tracemalloc)")
+    parser.add_argument('--salvar', help="grava os resultados em JSON (nova base)")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=0.2, help="piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    pasta_original = os.getcwd()
+    pasta = tempfile.mkdtemp(prefix='benchmark_dashboard_')
+    try:
+        # Snapshot e caches do app são gravados em caminhos relativos: isola tudo na pasta temporária
+        os.chdir(pasta)
+        for n in args.linhas:
+            shutil.rmtree(app.PASTA_CACHE, ignore_errors=True)
+            etapas = rodar_tamanho(n, pasta, args.repeticoes, args.semente, not args.sem_memoria)
+            resultados[str(n)] = etapas
+            print(f"\n{n:,} linhas")
+            print(f"  {'etapa':<24}{'tempo (s)':>12}{'pico memória':>16}{'payload':>14}")
+            for etapa, medida in etapas.items():
+                pico = '-' if medida['pico_bytes'] is None else _formatar_bytes(medida['pico_bytes'])
+                print(f"  {etapa:<24}{medida['segundos']:>12.4f}{pico:>16}"
+                      f"{_formatar_bytes(medida['payload_bytes']):>14}")
+    finally:
+        os.chdir(pasta_original)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'ambiente': {'python': platform.python_version(), 'numpy': np.__version__,
+                             'pandas': pd.__version__, 'plataforma': platform.platform()},
+                'resultados': resultados,
+            }, arquivo, indent=2)
+        print(f"\nResultados gravados em {args.salvar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            base = json.load(arquivo)['resultados']
+        regressoes = comparar(resultados, base, args.tolerancia)
+        if regressoes:
+            print(f"\nRegressões (> {args.tolerancia:.0%} mais lentas que {args.comparar}):")
+            for tamanho, etapa, antes, depois, razao in regressoes:
+                print(f"  {int(tamanho):,} linhas / {etapa}: {antes:.4f}s -> {depois:.4f}s ({razao:.2f}x)")
+            return 1
+        print(f"\nSem regressões em relação a {args.comparar}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
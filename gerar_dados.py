@@ -0,0 +1,407 @@
+"""Gerador de pedidos sintéticos com o esquema do df_selecionado.xlsx.
+
+Uso:
+    python gerar_dados.py                                        # 10.000 pedidos em df_selecionado.xlsx
+    python gerar_dados.py --linhas 5000000 --saida pedidos.parquet
+    python gerar_dados.py --linhas 1000000 --saida pedidos.db          # DASHBOARD_FONTE=sqlite:///pedidos.db
+    python gerar_dados.py --linhas 200000 --b2b 0.05 --promocao 0.6 --inicio 2023-01-01 --fim 2023-12-31
+
+Os pedidos são sorteados de forma vetorizada, em lotes, e gravados em Excel (.xlsx),
+CSV (.csv), Parquet (.parquet) ou na tabela `pedidos` de um banco SQLite (.db, .sqlite)
+ou DuckDB (.duckdb) sem manter o arquivo inteiro na memória. Cada coluna
+de informacoes_colunas é coberta (Tem_Promocao é derivada de IDs_Promocao ao carregar):
+valores assimétricos (lognormal por produto), proporção de vendas B2B configurável,
+promoções esparsas, distribuições de categoria, status e estado próximas às de um
+relatório de vendas real e datas dentro do período pedido. A mesma semente e o mesmo
+tamanho de lote reproduzem o mesmo arquivo.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Ordem das colunas do arquivo original
+COLUNAS = [
+    'index', 'ID_Pedido', 'Data_Pedido', 'Status_Pedido', 'Tipo_Envio', 'Sales Channel', 'Nivel_Entrega',
+    'Estilo', 'Codigo_Produto', 'Categoria', 'Size', 'ASIN', 'Courier Status', 'Qty', 'Moeda', 'Valor_Pedido',
+    'Cidade_Destino', 'Estado_Destino', 'CEP_Destino', 'Pais_Destino', 'IDs_Promocao', 'Venda_B2B',
+    'Responsavel_Envio', 'Unnamed: 22', 'Valor_Pedido_BRL',
+]
+
+# Categoria: (participação nos pedidos, preço médio em INR, prefixo do código de estilo)
+CATEGORIAS = {
+    'Set': (0.390, 830, 'SET'),
+    'kurta': (0.386, 455, 'JNE'),
+    'Western Dress': (0.120, 765, 'J0'),
+    'Top': (0.082, 525, 'J0'),
+    'Ethnic Dress': (0.009, 725, 'NW'),
+    'Blouse': (0.007, 520, 'BL'),
+    'Bottom': (0.003, 360, 'BTM'),
+    'Saree': (0.002, 800, 'SAR'),
+    'Dupatta': (0.001, 305, 'DPT'),
+}
+
+TAMANHOS = {
+    'M': 0.174, 'L': 0.170, 'XL': 0.161, 'XXL': 0.140, 'S': 0.131, '3XL': 0.114,
+    'XS': 0.084, '6XL': 0.006, '5XL': 0.004, '4XL': 0.002, 'Free': 0.014,
+}
+
+STATUS = {
+    'Shipped': 0.605, 'Shipped - Delivered to Buyer': 0.225, 'Cancelled': 0.142,
+    'Shipped - Returned to Seller': 0.015, 'Shipped - Picked Up': 0.008, 'Pending': 0.005,
+    'Pending - Waiting for Pick Up': 0.002, 'Shipped - Returning to Seller': 0.001,
+    'Shipped - Out for Delivery': 0.0003, 'Shipped - Rejected by Buyer': 0.0001,
+    'Shipped - Lost in Transit': 0.00004, 'Shipped - Damaged': 0.00001,
+}
+
+# Estado: (participação, [(cidade, prefixo do CEP, participação na UF), ...])
+ESTADOS = {
+    'MAHARASHTRA': (0.172, [('MUMBAI', 400, 0.45), ('PUNE', 411, 0.30), ('THANE', 401, 0.15), ('NAGPUR', 440, 0.10)]),
+    'KARNATAKA': (0.134, [('BENGALURU', 560, 0.85), ('MYSURU', 570, 0.15)]),
+    'TELANGANA': (0.087, [('HYDERABAD', 500, 1.0)]),
+    'TAMIL NADU': (0.087, [('CHENNAI', 600, 0.70), ('COIMBATORE', 641, 0.30)]),
+    'UTTAR PRADESH': (0.083, [('LUCKNOW', 226, 0.40), ('NOIDA', 201, 0.35), ('GHAZIABAD', 201, 0.25)]),
+    'DELHI': (0.054, [('NEW DELHI', 110, 1.0)]),
+    'KERALA': (0.051, [('KOCHI', 682, 0.55), ('THIRUVANANTHAPURAM', 695, 0.45)]),
+    'WEST BENGAL': (0.046, [('KOLKATA', 700, 1.0)]),
+    'ANDHRA PRADESH': (0.041, [('VISAKHAPATNAM', 530, 0.55), ('VIJAYAWADA', 520, 0.45)]),
+    'HARYANA': (0.036, [('GURUGRAM', 122, 0.70), ('FARIDABAD', 121, 0.30)]),
+    'GUJARAT': (0.035, [('AHMEDABAD', 380, 0.60), ('SURAT', 395, 0.40)]),
+    'RAJASTHAN': (0.021, [('JAIPUR', 302, 1.0)]),
+    'MADHYA PRADESH': (0.019, [('INDORE', 452, 0.55), ('BHOPAL', 462, 0.45)]),
+    'ODISHA': (0.017, [('BHUBANESWAR', 751, 1.0)]),
+    'PUNJAB': (0.016, [('LUDHIANA', 141, 0.55), ('MOHALI', 160, 0.45)]),
+    'BIHAR': (0.014, [('PATNA', 800, 1.0)]),
+    'UTTARAKHAND': (0.012, [('DEHRADUN', 248, 1.0)]),
+    'ASSAM': (0.010, [('GUWAHATI', 781, 1.0)]),
+    'JHARKHAND': (0.009, [('RANCHI', 834, 1.0)]),
+    'GOA': (0.007, [('PANAJI', 403, 1.0)]),
+    'CHHATTISGARH': (0.006, [('RAIPUR', 492, 1.0)]),
+    'HIMACHAL PRADESH': (0.004, [('SHIMLA', 171, 1.0)]),
+    'JAMMU & KASHMIR': (0.004, [('JAMMU', 180, 1.0)]),
+}
+
+PROMOCOES = [
+    'IN Core Free Shipping 2015/04/16-23-44-27-584',
+    'Amazon PLCC Free-Financing Universal Merchant AAT-WNKTBO3K27EJC',
+    'Amazon PLCC Free-Financing Universal Merchant AAT-XXRCW6NZEPZI4',
+    'Amazon PLCC Free-Financing Universal Merchant AAT-CXJHMC2YJUK76',
+    'Amazon PLCC Free-Financing Universal Merchant AAT-CC4FAVTYR4X7C',
+    'Amazon PLCC Free-Financing Universal Merchant AAT-7EAIGZYJEZWLM',
+    'VPC-44571-64137077 Coupon',
+    'VPC-44571-95434853 Coupon',
+    'Duplicated 2018/05/02-18-01-51-418',
+    'IN Core Free Shipping 2018/04/24-16-43-48-389',
+]
+
+PREFIXOS_PEDIDO = ['171', '402', '403', '404', '405', '406', '407', '408']
+DIGITOS = '0123456789'
+ALFANUMERICOS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# Tabela gravada nos bancos SQLite e DuckDB (a mesma que o dashboard lê por padrão)
+TABELA = 'pedidos'
+
+# Limite de linhas de uma planilha do Excel (sem contar o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1_048_575
+
+
+# Função auxiliar: pesos de um dicionário normalizados para probabilidades
+def _probabilidades(pesos):
+    p = np.asarray(pesos, dtype=np.float64)
+    return p / p.sum()
+
+
+# Função para gerar códigos aleatórios a partir de um molde, sem laços em Python
+def _codigos(rng, n, molde, alfabeto=DIGITOS):
+    """Cada '#' do molde vira um caractere sorteado do alfabeto; o resto é mantido"""
+    base = np.frombuffer(molde.encode('ascii'), dtype=np.uint8)
+    livres = np.flatnonzero(base == ord('#'))
+    tabela = np.frombuffer(alfabeto.encode('ascii'), dtype=np.uint8)
+    buffer = np.tile(base, (n, 1))
+    buffer[:, livres] = tabela[rng.integers(0, len(tabela), (n, len(livres)))]
+    return buffer.view(f'S{len(molde)}').ravel().astype(str)
+
+
+# Função para montar o catálogo de produtos (estilos x tamanhos) compartilhado por todos os lotes
+def montar_catalogo(rng, n_estilos=1_500):
+    """Estilos com categoria, preço base e popularidade (Zipf dentro da categoria); um SKU e um ASIN por tamanho"""
+    nomes = list(CATEGORIAS)
+    participacao, precos, prefixos = zip(*CATEGORIAS.values())
+    # Todas as categorias têm ao menos alguns estilos; as grandes recebem proporcionalmente mais
+    por_categoria = np.maximum(np.round(_probabilidades(participacao) * n_estilos).astype(int), 3)
+    categoria = np.repeat(np.arange(len(nomes)), por_categoria)
+    n_estilos = len(categoria)
+
+    popularidade = np.empty(n_estilos)
+    for i, quantidade in enumerate(por_categoria):
+        pesos = 1.0 / np.arange(1, quantidade + 1) ** 1.1
+        popularidade[categoria == i] = participacao[i] * rng.permutation(pesos / pesos.sum())
+
+    numeros = rng.choice(np.arange(100, 10_000), n_estilos, replace=False)
+    estilos = np.array([f'{prefixos[c]}{num}' for c, num in zip(categoria, numeros)], dtype=object)
+    tamanhos = list(TAMANHOS)
+    return {
+        'categoria': categoria,
+        'preco': np.asarray(precos, dtype=np.float64)[categoria] * rng.lognormal(0.0, 0.25, n_estilos),
+        'popularidade': _probabilidades(popularidade),
+        'estilos': estilos,
+        'skus': np.array([f'{e}-{t}' for e in estilos for t in tamanhos], dtype=object),
+        'asins': _codigos(rng, n_estilos * len(tamanhos), 'B0########', ALFANUMERICOS).astype(object),
+    }
+
+
+# Função para sortear IDs de promoção esparsos (lista separada por vírgulas, como no arquivo original)
+def _promocoes(rng, n, probabilidade):
+    """Strings compartilhadas por combinação: a coluna ocupa um ponteiro por linha"""
+    ids = np.full(n, None, dtype=object)
+    com_promocao = np.flatnonzero(rng.random(n) < probabilidade)
+    if len(com_promocao) == 0:
+        return ids
+    k = len(PROMOCOES)
+    # 1 a 3 IDs por pedido; a frete grátis aparece mais que os cupons
+    quantos = rng.choice([1, 2, 3], len(com_promocao), p=[0.70, 0.20, 0.10])
+    pesos = _probabilidades([8] + [2] * (k - 1))
+    sorteados = np.sort(rng.choice(k, (len(com_promocao), 3), p=pesos), axis=1)
+    sorteados[np.arange(3) >= quantos[:, None]] = k
+    codigos = (sorteados[:, 0] * (k + 1) + sorteados[:, 1]) * (k + 1) + sorteados[:, 2]
+    unicos, posicao = np.unique(codigos, return_inverse=True)
+    textos = np.array([
+        ','.join(dict.fromkeys(PROMOCOES[i] for i in (c // (k + 1) ** 2, c // (k + 1) % (k + 1), c % (k + 1)) if i < k))
+        for c in unicos
+    ], dtype=object)
+    ids[com_promocao] = textos[posicao]
+    return ids
+
+
+# Função para gerar um lote de pedidos sintéticos
+def gerar_pedidos(n, semente=0, inicio='2022-03-31', fim='2022-06-29', proporcao_b2b=0.007,
+                  proporcao_promocao=0.38, cambio=0.066, primeiro_indice=0, catalogo=None, rng=None):
+    """DataFrame com n pedidos no esquema de df_selecionado.xlsx"""
+    rng = rng if rng is not None else np.random.default_rng(semente)
+    if catalogo is None:
+        catalogo = montar_catalogo(np.random.default_rng(np.random.SeedSequence(semente, spawn_key=(0,))))
+
+    # Produto: estilo pela popularidade, tamanho pela grade
+    estilo = rng.choice(len(catalogo['estilos']), n, p=catalogo['popularidade'])
+    tamanho = rng.choice(len(TAMANHOS), n, p=_probabilidades(list(TAMANHOS.values())))
+    sku = estilo * len(TAMANHOS) + tamanho
+
+    # Datas: fins de semana um pouco mais movimentados
+    dias = pd.date_range(inicio, fim, freq='D')
+    if len(dias) == 0:
+        raise ValueError(f"Período vazio: {inicio} a {fim}")
+    data = dias[rng.choice(len(dias), n, p=_probabilidades(np.where(dias.dayofweek >= 5, 1.15, 1.0)))]
+
+    status = rng.choice(len(STATUS), n, p=_probabilidades(list(STATUS.values())))
+    nomes_status = np.array(list(STATUS))
+    cancelado = nomes_status[status] == 'Cancelled'
+    pendente = np.char.startswith(nomes_status[status], 'Pending')
+
+    # Envio: Amazon (Expedited, sem responsável) ou Merchant (Standard, Easy Ship)
+    merchant = rng.random(n) < 0.305
+    b2b = rng.random(n) < proporcao_b2b
+    # Promoções concentradas nos pedidos do próprio vendedor, como no relatório original
+    chance_promocao = np.clip(proporcao_promocao * np.where(merchant, 1.6, 0.74), 0.0, 1.0)
+
+    # Quantidade: quase sempre 1; cancelados em geral com 0; B2B compra em volume
+    qty = 1 + (rng.random(n) < 0.03) + (rng.random(n) < 0.005) * rng.integers(1, 4, n)
+    qty = np.where(b2b, 1 + rng.poisson(1.5, n), qty)
+    qty = np.where(cancelado & (rng.random(n) < 0.9), 0, qty)
+
+    # Valor: preço do produto com ruído lognormal (cauda à direita); parte dos cancelados sem valor
+    valor = (catalogo['preco'][estilo] * np.maximum(qty, 1) * rng.lognormal(0.0, 0.12, n)).round(2)
+    sem_valor = cancelado & (rng.random(n) < 0.45)
+    valor[sem_valor] = np.nan
+
+    # Destino: estado, cidade coerente com o estado e CEP com o prefixo da cidade
+    cidades = [(estado, cidade, prefixo, peso * p_uf)
+               for estado, (p_uf, lista) in ESTADOS.items() for cidade, prefixo, peso in lista]
+    destino = rng.choice(len(cidades), n, p=_probabilidades([c[3] for c in cidades]))
+    estados_cidade = pd.Categorical([c[0] for c in cidades], categories=list(ESTADOS))
+    nomes_cidades = list(dict.fromkeys(c[1] for c in cidades))
+    cidades_cidade = pd.Categorical([c[1] for c in cidades], categories=nomes_cidades)
+    cep = np.array([c[2] for c in cidades], dtype=np.float64)[destino] * 1000 + rng.integers(1, 100, n)
+    sem_endereco = rng.random(n) < 0.0003
+    codigos_estado = np.where(sem_endereco, -1, estados_cidade.codes[destino])
+    codigos_cidade = np.where(sem_endereco, -1, cidades_cidade.codes[destino])
+    cep[sem_endereco] = np.nan
+
+    # Entregador: cancelado, não enviado (pendentes) ou enviado; metade dos cancelados sem status
+    courier = np.where(cancelado, rng.choice([0, 1, -1], n, p=[0.3, 0.2, 0.5]), np.where(pendente, 1, 2))
+
+    lote = pd.DataFrame({
+        'index': np.arange(primeiro_indice, primeiro_indice + n),
+        'ID_Pedido': np.char.add(
+            np.array(PREFIXOS_PEDIDO)[rng.integers(0, len(PREFIXOS_PEDIDO), n)],
+            _codigos(rng, n, '-#######-#######')).astype(object),
+        'Data_Pedido': data,
+        'Status_Pedido': pd.Categorical.from_codes(status, list(STATUS)),
+        'Tipo_Envio': pd.Categorical.from_codes(merchant.astype(np.int8), ['Amazon', 'Merchant']),
+        'Sales Channel': pd.Categorical.from_codes((rng.random(n) < 0.001).astype(np.int8), ['Amazon.in', 'Non-Amazon']),
+        'Nivel_Entrega': pd.Categorical.from_codes(merchant.astype(np.int8), ['Expedited', 'Standard']),
+        'Estilo': catalogo['estilos'][estilo],
+        'Codigo_Produto': catalogo['skus'][sku],
+        'Categoria': pd.Categorical.from_codes(catalogo['categoria'][estilo], list(CATEGORIAS)),
+        'Size': pd.Categorical.from_codes(tamanho, list(TAMANHOS)),
+        'ASIN': catalogo['asins'][sku],
+        'Courier Status': pd.Categorical.from_codes(courier, ['Cancelled', 'Unshipped', 'Shipped']),
+        'Qty': qty.astype(np.int64),
+        'Moeda': pd.Categorical.from_codes(np.where(sem_valor, -1, 0), ['INR']),
+        'Valor_Pedido': valor,
+        'Cidade_Destino': pd.Categorical.from_codes(codigos_cidade, nomes_cidades),
+        'Estado_Destino': pd.Categorical.from_codes(codigos_estado, list(ESTADOS)),
+        'CEP_Destino': cep,
+        'Pais_Destino': pd.Categorical.from_codes(np.where(sem_endereco, -1, 0), ['IN']),
+        'IDs_Promocao': _promocoes(rng, n, chance_promocao),
+        'Venda_B2B': b2b,
+        'Responsavel_Envio': pd.Categorical.from_codes(np.where(merchant, 0, -1), ['Easy Ship']),
+        'Unnamed: 22': np.full(n, np.nan),
+        'Valor_Pedido_BRL': (valor * cambio).round(2),
+    }, columns=COLUNAS)
+    return lote
+
+
+# Função para gerar os pedidos em lotes, com sementes independentes e índices contínuos
+def gerar_em_lotes(n, tamanho_lote=100_000, semente=0, **opcoes):
+    """Gera DataFrames de até tamanho_lote linhas; o catálogo é o mesmo em todos os lotes"""
+    catalogo = montar_catalogo(np.random.default_rng(np.random.SeedSequence(semente, spawn_key=(0,))))
+    for numero, inicio in enumerate(range(0, n, tamanho_lote)):
+        rng = np.random.default_rng(np.random.SeedSequence(semente, spawn_key=(numero + 1,)))
+        yield gerar_pedidos(min(tamanho_lote, n - inicio), primeiro_indice=inicio, catalogo=catalogo, rng=rng, **opcoes)
+
+
+# Função auxiliar: grava os lotes em Parquet, um row group por lote
+def _gravar_parquet(lotes, caminho):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    esquema = None
+    try:
+        for lote in lotes:
+            if escritor is None:
+                esquema = pa.Schema.from_pandas(lote, preserve_index=False)
+                # Colunas inteiramente nulas no primeiro lote seriam inferidas como 'null'
+                for i, campo in enumerate(esquema):
+                    if pa.types.is_null(campo.type):
+                        esquema = esquema.set(i, campo.with_type(pa.string()))
+                escritor = pq.ParquetWriter(caminho, esquema)
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+# Função auxiliar: grava os lotes em CSV, com cabeçalho só no primeiro
+def _gravar_csv(lotes, caminho):
+    for numero, lote in enumerate(lotes):
+        lote.to_csv(caminho, mode='w' if numero == 0 else 'a', header=numero == 0, index=False)
+
+
+# Função auxiliar: grava os lotes em Excel no modo write-only do openpyxl (memória constante,
+# mas bem mais lento que os formatos colunares: prefira .parquet para milhões de linhas)
+def _gravar_excel(lotes, caminho):
+    from openpyxl import Workbook
+
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet()
+    planilha.append(COLUNAS)
+    for lote in lotes:
+        linhas = lote.astype(object).where(lote.notna(), None)
+        for linha in linhas.itertuples(index=False, name=None):
+            planilha.append(linha)
+    livro.save(caminho)
+
+
+# Função auxiliar: grava os lotes na tabela `pedidos` de um banco SQLite (booleanos como 0/1)
+def _gravar_sqlite(lotes, caminho):
+    import sqlite3
+
+    with sqlite3.connect(caminho) as conexao:
+        for numero, lote in enumerate(lotes):
+            lote.to_sql(TABELA, conexao, if_exists='replace' if numero == 0 else 'append', index=False)
+    conexao.close()
+
+
+# Função auxiliar: grava os lotes na tabela `pedidos` de um banco DuckDB
+def _gravar_duckdb(lotes, caminho):
+    import duckdb
+
+    conexao = duckdb.connect(caminho)
+    try:
+        for numero, lote in enumerate(lotes):
+            conexao.register('lote', lote)
+            if numero == 0:
+                conexao.execute(f'CREATE OR REPLACE TABLE {TABELA} AS SELECT * FROM lote')
+            else:
+                conexao.execute(f'INSERT INTO {TABELA} SELECT * FROM lote')
+            conexao.unregister('lote')
+    finally:
+        conexao.close()
+
+
+FORMATOS = {
+    '.parquet': _gravar_parquet, '.csv': _gravar_csv, '.xlsx': _gravar_excel,
+    '.db': _gravar_sqlite, '.sqlite': _gravar_sqlite, '.duckdb': _gravar_duckdb,
+}
+
+
+# Função para gerar e gravar n pedidos, escolhendo o formato pela extensão do arquivo
+def gravar_pedidos(caminho, n, tamanho_lote=100_000, semente=0, **opcoes):
+    """Grava em um arquivo temporário e só substitui o destino no final"""
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao not in FORMATOS:
+        raise ValueError(f"Formato não suportado: {extensao or caminho} (use {', '.join(FORMATOS)})")
+    if extensao == '.xlsx' and n > LIMITE_LINHAS_EXCEL:
+        raise ValueError(f"O Excel comporta no máximo {LIMITE_LINHAS_EXCEL:,} linhas; use .parquet ou .csv")
+    temporario = f'{caminho}.tmp'
+    try:
+        FORMATOS[extensao](gerar_em_lotes(n, tamanho_lote, semente, **opcoes), temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=10_000, help="quantidade de pedidos")
+    parser.add_argument('--saida', default='df_selecionado.xlsx',
+                        help="arquivo de saída (.xlsx, .csv, .parquet, .db/.sqlite ou .duckdb)")
+    parser.add_argument('--lote', type=int, default=100_000, help="pedidos gerados por lote")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--inicio', default='2022-03-31', help="primeira data dos pedidos")
+    parser.add_argument('--fim', default='2022-06-29', help="última data dos pedidos")
+    parser.add_argument('--b2b', type=float, default=0.007, help="proporção de vendas B2B")
+    parser.add_argument('--promocao', type=float, default=0.38, help="proporção de pedidos com promoção")
+    parser.add_argument('--cambio', type=float, default=0.066, help="BRL por INR em Valor_Pedido_BRL")
+    parser.add_argument('--sobrescrever', action='store_true', help="substitui o arquivo de saída se ele existir")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.saida) and not args.sobrescrever:
+        parser.error(f"{args.saida} já existe; use --sobrescrever para substituí-lo")
+    if args.linhas <= 0 or args.lote <= 0:
+        parser.error("--linhas e --lote devem ser positivos")
+    for nome in ('b2b', 'promocao'):
+        if not 0 <= getattr(args, nome) <= 1:
+            parser.error(f"--{nome} deve estar entre 0 e 1")
+    try:
+        if pd.Timestamp(args.inicio) > pd.Timestamp(args.fim):
+            parser.error("--inicio deve ser anterior a --fim")
+    except ValueError as e:
+        parser.error(f"Data inválida: {e}")
+
+    inicio = time.perf_counter()
+    try:
+        gravar_pedidos(args.saida, args.linhas, args.lote, args.semente, inicio=args.inicio, fim=args.fim,
+                       proporcao_b2b=args.b2b, proporcao_promocao=args.promocao, cambio=args.cambio)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{args.linhas:,} pedidos gravados em {args.saida} ({time.perf_counter() - inicio:.1f} s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import logging
+import os
+import sys
+
+import pytest
+
+# O app é importado em "bare mode" (como no benchmark.py): os comandos do Streamlit viram no-ops;
+# os avisos de "missing ScriptRunContext" de cada chamada são silenciados
+logging.disable(logging.WARNING)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    """Pasta de trabalho temporária: snapshot e caches do app são gravados em caminhos relativos"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,338 @@
+"""Estatísticas de passada única, resumos mescláveis e testes vetorizados contra pandas, scipy e statsmodels."""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+
+import app
+import gerar_dados
+
+
+@pytest.fixture(scope='module')
+def pedidos():
+    return app.preparar_dados(gerar_dados.gerar_pedidos(4000, semente=11))
+
+
+@pytest.fixture
+def valores():
+    rng = np.random.default_rng(5)
+    # Valores repetidos (moda bem definida), cauda longa e alguns NaN
+    x = np.round(rng.lognormal(3.5, 0.6, 5000), 1)
+    x[rng.choice(len(x), 50, replace=False)] = np.nan
+    return x
+
+
+def _lotes(df, n_lotes):
+    return [df.iloc[i::n_lotes] for i in range(n_lotes)]
+
+
+def _partes(x, n_partes, semente=0):
+    cortes = np.sort(np.random.default_rng(semente).choice(np.arange(1, len(x)), n_partes - 1, replace=False))
+    return np.split(x, cortes)
+
+
+# Estatísticas descritivas com uma ordenação
+
+def test_calcular_estatisticas(valores):
+    serie = pd.Series(valores)
+    estatisticas = app.calcular_estatisticas(serie, quantis=(0.1, 0.25, 0.75, 0.9))
+    esperado = {
+        'count': len(serie), 'mean': serie.mean(), 'median': serie.median(), 'mode': serie.mode().iloc[0],
+        'std': serie.std(), 'var': serie.var(), 'min': serie.min(), 'max': serie.max(),
+        'q10': serie.quantile(0.1), 'q25': serie.quantile(0.25), 'q75': serie.quantile(0.75), 'q90': serie.quantile(0.9),
+        'iqr': serie.quantile(0.75) - serie.quantile(0.25), 'cv': serie.std() / serie.mean() * 100,
+    }
+    for chave, valor in esperado.items():
+        assert estatisticas[chave] == pytest.approx(valor, rel=1e-12), chave
+
+
+def test_calcular_estatisticas_vazia():
+    estatisticas = app.calcular_estatisticas(pd.Series([np.nan, np.nan]))
+    assert estatisticas['count'] == 2
+    assert np.isnan(estatisticas['mean']) and np.isnan(estatisticas['q25'])
+
+
+def test_calcular_estatisticas_por_grupo(valores):
+    grupos = pd.Series(np.random.default_rng(1).choice(['a', 'b', 'c', 'd'], len(valores), p=[0.5, 0.3, 0.199, 0.001]),
+                       name='grupo')
+    tabela = app.calcular_estatisticas_por_grupo(valores, grupos, quantis=(0.1, 0.25, 0.75))
+    for rotulo, serie in pd.Series(valores).groupby(grupos):
+        serie = serie.dropna()
+        linha = tabela.loc[rotulo]
+        assert linha['count'] == len(serie)
+        assert linha['mode'] == serie.mode().iloc[0]
+        for chave, valor in {'mean': serie.mean(), 'median': serie.median(), 'std': serie.std(),
+                             'min': serie.min(), 'max': serie.max(), 'q10': serie.quantile(0.1),
+                             'q25': serie.quantile(0.25), 'q75': serie.quantile(0.75)}.items():
+            assert linha[chave] == pytest.approx(valor, rel=1e-12, nan_ok=True), (rotulo, chave)
+
+
+# Resumos mescláveis
+
+def test_acumulador_combinar(valores):
+    # Lotes de tamanhos diferentes, mesclados em árvore (Chan) e em sequência (Welford por lote)
+    acumuladores = [app.AcumuladorNumerico().adicionar(parte) for parte in _partes(valores, 7)]
+    arvore = acumuladores[0]
+    for direita in (acumuladores[1].combinar(acumuladores[2]), acumuladores[3].combinar(acumuladores[4]),
+                    acumuladores[5].combinar(acumuladores[6])):
+        arvore.combinar(direita)
+    sequencial = app.AcumuladorNumerico()
+    for parte in _partes(valores, 30, semente=2):
+        sequencial.adicionar(parte)
+
+    serie = pd.Series(valores).dropna()
+    for acumulador in (arvore, sequencial):
+        assert acumulador.n == len(serie)
+        assert acumulador.soma == pytest.approx(serie.sum(), rel=1e-12)
+        assert acumulador.media == pytest.approx(serie.mean(), rel=1e-12)
+        assert acumulador.variancia == pytest.approx(serie.var(), rel=1e-10)
+        assert (acumulador.minimo, acumulador.maximo) == (serie.min(), serie.max())
+
+
+def test_acumulador_deslocado():
+    # Média grande e variância pequena: a fórmula ingênua soma dos quadrados - soma²/n perde todos os dígitos
+    x = 1e9 + np.random.default_rng(3).normal(0, 1, 10_000)
+    acumulador = app.AcumuladorNumerico()
+    for parte in _partes(x, 10):
+        acumulador.adicionar(parte)
+    assert acumulador.variancia == pytest.approx(x.var(ddof=1), rel=1e-6)
+
+
+@pytest.mark.parametrize('erro_relativo', [0.01, 0.05])
+def test_sketch_quantis_erro_relativo(erro_relativo):
+    rng = np.random.default_rng(4)
+    x = np.concatenate([rng.lognormal(3, 1, 20_000), -rng.lognormal(1, 0.5, 3_000), np.zeros(500)])
+    sketch = app.SketchQuantis(erro_relativo).adicionar(x)
+    ordenados = np.sort(x)
+    qs = np.linspace(0, 1, 101)
+    # O sketch devolve o valor de posto floor(q (n - 1)) com erro relativo limitado
+    exatos = ordenados[np.floor(qs * (len(x) - 1)).astype(np.int64)]
+    aproximados = sketch.quantis(qs)
+    assert np.all(np.abs(aproximados - exatos) <= erro_relativo * np.abs(exatos) + 1e-12)
+
+
+def test_sketch_combinar_igual_ao_sketch_inteiro(valores):
+    inteiro = app.SketchQuantis().adicionar(valores)
+    combinado = app.SketchQuantis()
+    for parte in _partes(valores, 5):
+        combinado.combinar(app.SketchQuantis().adicionar(parte))
+    assert (combinado.positivos, combinado.negativos, combinado.zeros, combinado.contagem) == \
+        (inteiro.positivos, inteiro.negativos, inteiro.zeros, inteiro.contagem)
+
+    particoes = np.random.default_rng(6).choice(['SP', 'RJ', 'MG'], len(valores))
+    por_particao = app.construir_sketches_por_particao(valores, particoes)
+    for rotulo, sketch in por_particao.items():
+        direto = app.SketchQuantis().adicionar(valores[particoes == rotulo])
+        assert (sketch.positivos, sketch.contagem) == (direto.positivos, direto.contagem)
+    with pytest.raises(ValueError):
+        app.SketchQuantis(0.01).combinar(app.SketchQuantis(0.02))
+
+
+# Bootstrap
+
+def test_postos_bootstrap_igual_a_forca_bruta():
+    rng = np.random.default_rng(8)
+    ordenados = np.sort(rng.lognormal(0, 1, 301))
+    postos = app._postos_bootstrap(ordenados, (151,), 4000, np.random.default_rng(9))[0]
+    reamostras = np.median(rng.choice(ordenados, size=(4000, len(ordenados))), axis=1)
+    assert set(np.unique(postos)) <= set(ordenados)
+    assert stats.ks_2samp(postos, reamostras).pvalue > 0.001
+    # Postos pares compartilham os sorteios: o menor nunca passa o maior
+    baixo, alto = app._postos_bootstrap(ordenados[:300], (150, 151), 2000, np.random.default_rng(10))
+    assert np.all(baixo <= alto)
+
+
+def test_aceleracao_jackknife():
+    x = np.random.default_rng(12).exponential(2.0, 200)
+    jackknife = np.array([np.delete(x, i).mean() for i in range(len(x))])
+    desvios = jackknife.mean() - jackknife
+    esperado = (desvios ** 3).sum() / (6 * (desvios ** 2).sum() ** 1.5)
+    assert app._aceleracao_jackknife(x, 'media') == pytest.approx(esperado, rel=1e-9)
+    # Com um bloco por observação, o jackknife por blocos é o jackknife exato
+    jackknife = np.array([np.median(np.delete(x, i)) for i in range(len(x))])
+    desvios = jackknife.mean() - jackknife
+    esperado = (desvios ** 3).sum() / (6 * (desvios ** 2).sum() ** 1.5)
+    assert app._aceleracao_jackknife(np.sort(x), 'mediana', max_blocos=len(x)) == pytest.approx(esperado, rel=1e-9)
+
+
+@pytest.mark.parametrize('estatistica, funcao', [('media', np.mean), ('mediana', np.median)])
+@pytest.mark.parametrize('metodo', ['percentil', 'bca'])
+def test_ic_bootstrap_contra_scipy(estatistica, funcao, metodo):
+    x = np.random.default_rng(13).lognormal(3, 0.8, 1500)
+    ic = app.calcular_ic_bootstrap(x, estatistica, metodo=metodo, n_reamostras=4000, n_threads=1)
+    referencia = stats.bootstrap((x,), funcao, n_resamples=4000, method='BCa' if metodo == 'bca' else 'percentile',
+                                 random_state=np.random.default_rng(14)).confidence_interval
+    assert ic['estimativa'] == pytest.approx(funcao(x))
+    largura = referencia.high - referencia.low
+    # Mesma distribuição de reamostras, sementes diferentes: extremos a menos de 10% da largura
+    assert ic['ic_inferior'] == pytest.approx(referencia.low, abs=0.1 * largura)
+    assert ic['ic_superior'] == pytest.approx(referencia.high, abs=0.1 * largura)
+
+
+def test_ic_bootstrap_nao_depende_das_threads():
+    x = np.random.default_rng(15).normal(10, 2, 800)
+    uma = app.calcular_ic_bootstrap(x, n_reamostras=3000, n_threads=1)
+    varias = app.calcular_ic_bootstrap(x, n_reamostras=3000, n_threads=3)
+    assert (uma['ic_inferior'], uma['ic_superior']) == (varias['ic_inferior'], varias['ic_superior'])
+
+
+# Testes robustos: permutação e Mann-Whitney
+
+def _grupos_deslocados(deslocamento, semente=17):
+    rng = np.random.default_rng(semente)
+    return rng.lognormal(3, 0.7, 120) * (1 + deslocamento), rng.lognormal(3, 0.7, 150)
+
+
+def _permutacao_completa(grupo1, grupo2, unilateral, n_permutacoes=20_000):
+    # Um único bloco: nenhuma verificação intermediária, todas as permutações são feitas
+    return app.teste_permutacao(grupo1, grupo2, unilateral, max_permutacoes=n_permutacoes,
+                                permutacoes_por_bloco=n_permutacoes, n_threads=1)
+
+
+@pytest.mark.parametrize('unilateral', [True, False])
+def test_permutacao_contra_scipy(unilateral):
+    grupo1, grupo2 = _grupos_deslocados(0.08)
+    resultado = _permutacao_completa(grupo1, grupo2, unilateral)
+    # Bilateral = |diferença| tão extrema quanto a observada
+    diferenca = (lambda x, y: np.mean(x) - np.mean(y)) if unilateral else (lambda x, y: abs(np.mean(x) - np.mean(y)))
+    referencia = stats.permutation_test((grupo1, grupo2), diferenca, permutation_type='independent',
+                                        n_resamples=20_000, alternative='greater', random_state=np.random.default_rng(18))
+    assert resultado['diferenca'] == pytest.approx(grupo1.mean() - grupo2.mean())
+    assert resultado['n_permutacoes'] == 20_000 and not resultado['parada_antecipada']
+    assert 0.01 < referencia.pvalue < 0.9
+    # Mesmas permutações aleatórias, sementes diferentes: erro de Monte Carlo de ~0,004
+    assert resultado['p_valor'] == pytest.approx(referencia.pvalue, abs=0.015)
+
+
+@pytest.mark.parametrize('deslocamento', [0.0, 0.08, 0.3])
+def test_parada_antecipada_mantem_a_decisao(deslocamento):
+    grupo1, grupo2 = _grupos_deslocados(deslocamento)
+    antecipada = app.teste_permutacao(grupo1, grupo2, n_threads=1)
+    completa = _permutacao_completa(grupo1, grupo2, True)
+    assert antecipada['parada_antecipada'] and antecipada['n_permutacoes'] < completa['n_permutacoes']
+    assert (antecipada['p_valor'] < 0.05) == (completa['p_valor'] < 0.05)
+
+
+def test_testes_robustos_contra_scipy():
+    grupo1, grupo2 = _grupos_deslocados(0.2)
+    grupo1[[4, 40]] = np.nan
+    resultados = app.testes_robustos(grupo1, grupo2)
+    limpo = grupo1[~np.isnan(grupo1)]
+    mann_whitney = stats.mannwhitneyu(limpo, grupo2, alternative='greater')
+    welch = stats.ttest_ind(limpo, grupo2, equal_var=False, alternative='greater')
+    assert resultados['mann_whitney'] == pytest.approx({'estatistica': mann_whitney.statistic, 'p_valor': mann_whitney.pvalue})
+    assert resultados['welch'] == pytest.approx({'estatistica': welch.statistic, 'p_valor': welch.pvalue})
+    assert resultados['permutacao']['diferenca'] == pytest.approx(limpo.mean() - grupo2.mean())
+
+
+# Comparações múltiplas e testes vetorizados
+
+@pytest.mark.parametrize('metodo, referencia', [('holm', 'holm'), ('bh', 'fdr_bh')])
+def test_corrigir_p_valores(metodo, referencia):
+    p = np.random.default_rng(16).beta(0.5, 3, 40)
+    p[[3, 17]] = np.nan
+    p[5] = p[6]
+    corrigidos = app.corrigir_p_valores(p, metodo)
+    validos = ~np.isnan(p)
+    np.testing.assert_allclose(corrigidos[validos], multipletests(p[validos], method=referencia)[1], rtol=1e-12)
+    assert np.isnan(corrigidos[~validos]).all()
+
+
+@pytest.mark.parametrize('unilateral', [True, False])
+def test_testes_por_segmento_contra_welch(pedidos, unilateral):
+    tabela = app.testes_por_segmento(pedidos, teste_unilateral=unilateral)
+    assert len(tabela) > 10
+    for linha in tabela.itertuples():
+        indicador = app.COMPARACOES_SEGMENTO[linha.Comparação]
+        segmento = pedidos[pedidos[linha.Segmento].astype(str) == linha.Valor]
+        com = segmento.loc[segmento[indicador] == True, 'Valor_Pedido_BRL'].dropna()
+        sem = segmento.loc[segmento[indicador] == False, 'Valor_Pedido_BRL'].dropna()
+        assert (linha.n_com, linha.n_sem) == (len(com), len(sem))
+        assert linha.media_com == pytest.approx(com.mean(), rel=1e-9, nan_ok=True)
+        if len(com) < 2 or len(sem) < 2:
+            continue
+        welch = stats.ttest_ind(com, sem, equal_var=False, alternative='greater' if unilateral else 'two-sided')
+        assert linha.t == pytest.approx(welch.statistic, rel=1e-7)
+        assert linha.p_valor == pytest.approx(welch.pvalue, rel=1e-6, abs=1e-12)
+    validos = tabela['p_valor'].notna().to_numpy()
+    np.testing.assert_allclose(tabela['p_holm'][validos], multipletests(tabela['p_valor'][validos], method='holm')[1])
+
+
+# Top-K
+
+def test_topk_exato_com_capacidade_suficiente(pedidos):
+    top = app.TopK(capacidade=10_000)
+    for lote in _lotes(pedidos, 6):
+        top.combinar(app.TopK(capacidade=10_000).adicionar(lote.groupby('Estilo')['Valor_Pedido_BRL'].sum()))
+    exato = pedidos.groupby('Estilo')['Valor_Pedido_BRL'].sum().nlargest(20)
+    resultado = top.top(20)
+    assert top.limite == 0
+    np.testing.assert_allclose(resultado['peso'].to_numpy(), exato.to_numpy(), rtol=1e-12)
+    assert (resultado['peso'] == resultado['minimo']).all()
+
+
+def test_topk_limites_garantidos(pedidos):
+    # Capacidade pequena: cada item guardado tem o peso real entre `minimo` e `peso`,
+    # e nenhum item descartado pesa mais que o limite
+    top = app.TopK(capacidade=50)
+    for lote in _lotes(pedidos, 20):
+        top.adicionar(lote.groupby('Estilo')['Qty'].sum().astype('float64'))
+    exato = pedidos.groupby('Estilo')['Qty'].sum()
+    resultado = top.top(50)
+    reais = exato.reindex(resultado.index)
+    assert (reais <= resultado['peso'] + 1e-9).all() and (reais >= resultado['minimo'] - 1e-9).all()
+    assert exato.drop(top.pesos.index).max() <= top.limite + 1e-9
+    # Os itens cujo mínimo garantido supera o limite estão de fato no top real
+    certos = resultado.index[resultado['minimo'] > top.limite]
+    assert set(certos) <= set(exato.nlargest(len(top.pesos)).index)
+
+
+# Promoções (CSR)
+
+def _promocoes_explodidas(pedidos):
+    listas = pedidos['IDs_Promocao'].astype(object).map(
+        lambda c: list(dict.fromkeys(p.strip() for p in str(c).split(',') if p.strip())) if pd.notna(c) else [])
+    return pd.DataFrame({'linha': np.arange(len(pedidos)), 'promocao': listas.to_numpy(),
+                         'valor': pedidos['Valor_Pedido_BRL'].to_numpy()}).explode('promocao').dropna(subset=['promocao'])
+
+
+def test_tabela_promocoes_contra_explode(pedidos):
+    tabela = app.TabelaPromocoes(pedidos['IDs_Promocao'])
+    explodidas = _promocoes_explodidas(pedidos)
+    assert tabela.n == len(pedidos)
+    assert tabela.promocoes == sorted(explodidas['promocao'].unique())
+    assert len(tabela.ids) == len(explodidas)
+
+    somas = tabela.somar({'valor': pedidos['Valor_Pedido_BRL'].fillna(0), 'pedidos': np.ones(len(pedidos))})
+    esperado = explodidas.assign(valor=explodidas['valor'].fillna(0)).groupby('promocao').agg(
+        valor=('valor', 'sum'), pedidos=('linha', 'size'))
+    np.testing.assert_allclose(somas.loc[esperado.index, 'valor'], esperado['valor'], rtol=1e-12)
+    np.testing.assert_array_equal(somas.loc[esperado.index, 'pedidos'], esperado['pedidos'])
+
+    escolhidas = tabela.promocoes[:3]
+    np.testing.assert_array_equal(tabela.linhas(escolhidas),
+                                  np.unique(explodidas.loc[explodidas['promocao'].isin(escolhidas), 'linha']))
+
+
+def test_resumo_promocoes_contra_groupby(pedidos):
+    resumo = app.ResumoPromocoes()
+    for lote in _lotes(pedidos, 5):
+        resumo.combinar(app.ResumoPromocoes().adicionar(lote))
+    explodidas = _promocoes_explodidas(pedidos)
+    esperado = explodidas.groupby('promocao')['valor'].agg(['size', 'count', 'sum', 'var'])
+    tabela = resumo.tabela.loc[esperado.index]
+    np.testing.assert_array_equal(tabela['pedidos'], esperado['size'])
+    np.testing.assert_array_equal(tabela['n'], esperado['count'])
+    np.testing.assert_allclose(tabela['soma'], esperado['sum'], rtol=1e-12)
+    # M2 por promoção = variância amostral x (n - 1)
+    varios = esperado['count'] > 1
+    np.testing.assert_allclose(tabela['m2'][varios], (esperado['var'] * (esperado['count'] - 1))[varios], rtol=1e-8)
+
+    sem = pedidos.loc[pedidos['Tem_Promocao'] == False, 'Valor_Pedido_BRL'].dropna()
+    efeitos = resumo.efeitos(app.AcumuladorNumerico().adicionar(sem))
+    for promocao, linha in efeitos.iterrows():
+        com = explodidas.loc[explodidas['promocao'] == promocao, 'valor'].dropna()
+        welch = stats.ttest_ind(com, sem, equal_var=False, alternative='greater')
+        assert linha['media'] == pytest.approx(com.mean(), rel=1e-12)
+        assert linha['p_valor'] == pytest.approx(welch.pvalue, rel=1e-6, abs=1e-12)
@@ -0,0 +1,59 @@
+"""Cache LRU de figuras: montagem só na falta, descarte dos menos usados acima do limite de bytes."""
+import plotly.graph_objects as go
+
+import app
+
+
+def _figura(n):
+    return go.Figure(go.Bar(x=list(range(n)), y=list(range(n))))
+
+
+def _montar(n, montadas):
+    def construir():
+        montadas.append(n)
+        return _figura(n)
+    return construir
+
+
+def test_acerto_nao_remonta():
+    cache, montadas = app.CacheObjetosFigura(), []
+    fig, tamanho, construida = cache.obter('a', _montar(10, montadas))
+    assert construida and tamanho == len(fig.to_json()) == cache.total_bytes
+    mesma, tamanho_acerto, construida = cache.obter('a', _montar(10, montadas))
+    assert mesma is fig and tamanho_acerto == tamanho and not construida
+    assert montadas == [10] and (cache.acertos, cache.faltas) == (1, 1)
+
+
+def test_descarte_lru_pelo_limite_de_bytes():
+    tamanho = len(_figura(50).to_json())
+    # Cabem duas figuras de 50 pontos, não três
+    cache, montadas = app.CacheObjetosFigura(max_bytes=2 * tamanho + tamanho // 2), []
+    cache.obter('a', _montar(50, montadas))
+    cache.obter('b', _montar(50, montadas))
+    cache.obter('a', _montar(50, montadas))  # 'a' passa a ser a mais recente
+    cache.obter('c', _montar(50, montadas))  # descarta 'b', a menos usada
+    assert list(cache._figuras) == ['a', 'c']
+    assert cache.total_bytes == 2 * tamanho <= cache.max_bytes
+
+    # 'b' volta a ser montada; 'a' sai
+    cache.obter('b', _montar(50, montadas))
+    assert list(cache._figuras) == ['c', 'b'] and len(montadas) == 4
+
+    # Uma figura maior que o limite ainda é guardada sozinha (a mais recente nunca é descartada)
+    grande = app.CacheObjetosFigura(max_bytes=10)
+    grande.obter('a', _montar(50, montadas))
+    grande.obter('b', _montar(50, montadas))
+    assert list(grande._figuras) == ['b'] and grande.total_bytes == tamanho
+
+    cache.limpar()
+    assert cache.total_bytes == 0 and not cache._figuras
+
+
+def test_figura_em_cache_registra_montagem_e_acerto():
+    cache, instrumentacao = app.CacheObjetosFigura(), app.Instrumentacao()
+    for nbins in (20, 20, 30):
+        app.figura_em_cache(('dados', 1), 'histograma', lambda: _figura(nbins),
+                            cache=cache, instrumentacao=instrumentacao, nbins=nbins)
+    # Parâmetros diferentes são figuras diferentes
+    assert [g['construido'] for g in instrumentacao.graficos] == [True, False, True]
+    assert len(cache._figuras) == 2
@@ -0,0 +1,59 @@
+"""Carga assíncrona: a thread de fundo termina com o DataFrame completo ou deixa o erro visível."""
+import pandas as pd
+import pytest
+
+import app
+import gerar_dados
+
+N_PEDIDOS = 1500
+
+
+class FonteComFalha:
+    """Fonte que entrega um lote e falha no segundo, como um arquivo truncado"""
+
+    def __init__(self, lote):
+        self.lote = lote
+
+    def metadados(self):
+        return {'total_registros': 2 * len(self.lote), 'valor_total': None}
+
+    def leitura_rapida(self):
+        return False
+
+    def ler_em_lotes(self, tamanho_lote):
+        yield self.lote
+        raise OSError("arquivo truncado")
+
+
+def test_carga_concluida(pasta):
+    caminho = str(pasta / 'pedidos.csv')
+    gerar_dados.gravar_pedidos(caminho, N_PEDIDOS, semente=9)
+    carregamento = app.CarregamentoAssincrono(app.FonteArquivo(caminho), tamanho_lote=400)
+    assert carregamento.concluido.wait(60)
+
+    assert carregamento.erro is None
+    assert carregamento.linhas_lidas == N_PEDIDOS and carregamento.progresso() == 1.0
+    pd.testing.assert_frame_equal(carregamento.df, app.preparar_dados(pd.read_csv(caminho)))
+    parciais = carregamento.agregados_parciais()
+    assert parciais['total_registros'] == N_PEDIDOS
+    assert parciais['valor_total'] == pytest.approx(carregamento.df['Valor_Pedido_BRL'].sum())
+    # A carga deixa o snapshot Parquet gravado para as próximas
+    assert app.FonteArquivo(caminho).leitura_rapida()
+
+
+def test_falha_da_carga_e_informada(pasta, monkeypatch):
+    lote = app.preparar_dados(gerar_dados.gerar_pedidos(200, semente=10))
+    carregamento = app.CarregamentoAssincrono(FonteComFalha(lote))
+    assert carregamento.concluido.wait(60)
+
+    # O lote lido antes da falha fica nos parciais; o DataFrame não é publicado pela metade
+    assert isinstance(carregamento.erro, OSError) and carregamento.df is None
+    assert carregamento.linhas_lidas == 200 and carregamento.progresso() == 0.5
+
+    # A página mostra o erro em vez de ficar esperando pelos dados
+    erros = []
+    monkeypatch.setattr(app, 'MODO_CARREGAMENTO', 'assincrono')
+    monkeypatch.setattr(app, 'obter_carregamento', lambda versao: carregamento)
+    monkeypatch.setattr(app.st, 'error', erros.append)
+    assert app.obter_dados('v1') is None
+    assert erros == ["Erro ao carregar dados: arquivo truncado"]
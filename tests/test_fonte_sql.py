@@ -0,0 +1,118 @@
+"""Agregações empurradas para o banco (FonteSQL.agregar) contra calcular_agregados no mesmo DataFrame."""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+import app
+import gerar_dados
+
+N_PEDIDOS = 3000
+
+
+@pytest.fixture(params=['sqlite', 'duckdb'])
+def fonte(request, pasta):
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+    caminho = f"pedidos.{'db' if request.param == 'sqlite' else 'duckdb'}"
+    gerar_dados.gravar_pedidos(str(pasta / caminho), N_PEDIDOS, semente=7)
+    return app.abrir_fonte(f"{request.param}:///{caminho}")
+
+
+@pytest.fixture
+def agregados(fonte):
+    """(agregados do banco, agregados calculados no app sobre as mesmas linhas, DataFrame)"""
+    df = fonte.ler()
+    return fonte.agregar(), app.calcular_agregados(df), df
+
+
+def _series_iguais(banco, referencia):
+    referencia = referencia[referencia != 0]
+    referencia.index = referencia.index.astype(str)
+    pd.testing.assert_series_equal(banco.sort_index(), referencia.sort_index(),
+                                   check_dtype=False, check_names=False, check_index_type=False)
+
+
+def test_totais_e_estatisticas(agregados):
+    banco, referencia, _ = agregados
+    assert banco['total_registros'] == referencia['total_registros'] == N_PEDIDOS
+    assert banco['total_colunas'] == referencia['total_colunas']
+    assert banco['valor_total'] == pytest.approx(referencia['valor_total'], rel=1e-12)
+    for chave, valor in referencia['estatisticas'].items():
+        assert banco['estatisticas'][chave] == pytest.approx(valor, rel=1e-9, nan_ok=True), chave
+    for chave in ('media', 'ic_inferior', 'ic_superior'):
+        assert banco['ic_95'][chave] == pytest.approx(referencia['ic_95'][chave], rel=1e-9)
+    for nome, grupo in referencia['grupos'].items():
+        assert banco['grupos'][nome]['n'] == grupo['n']
+        assert banco['grupos'][nome]['media'] == pytest.approx(grupo['media'], rel=1e-9)
+
+
+def test_contagens(agregados):
+    banco, referencia, _ = agregados
+    for chave in ('vendas_categoria', 'receita_categoria', 'status_pedidos'):
+        _series_iguais(banco[chave], referencia[chave])
+
+
+def test_histograma_e_caixas(agregados):
+    banco, referencia, _ = agregados
+    np.testing.assert_array_equal(banco['histograma'][0], referencia['histograma'][0])
+    np.testing.assert_allclose(banco['histograma'][1], referencia['histograma'][1])
+    # Quartis pelo ROW_NUMBER() no banco: mesma interpolação de pandas.Series.quantile
+    for comparacao, caixas in referencia['caixas'].items():
+        for grupo, caixa in caixas.items():
+            for chave, valor in caixa.items():
+                if chave == 'outliers':
+                    np.testing.assert_allclose(np.sort(banco['caixas'][comparacao][grupo][chave]), np.sort(valor))
+                else:
+                    assert banco['caixas'][comparacao][grupo][chave] == pytest.approx(valor, rel=1e-9), (comparacao, grupo, chave)
+
+
+def test_testes_t(agregados):
+    banco, _, df = agregados
+    # O banco não tem o teste de Levene: os dois testes usam Welch
+    for chave, mascara in (('teste_b2b', df['Venda_B2B']), ('teste_promo', df['Tem_Promocao'])):
+        valores = df['Valor_Pedido_BRL']
+        esperado = stats.ttest_ind(valores[mascara].dropna(), valores[~mascara].dropna(), equal_var=False)
+        assert banco[chave]['t_stat'] == pytest.approx(esperado.statistic, rel=1e-9)
+        assert banco[chave]['p_bilateral'] == pytest.approx(esperado.pvalue, rel=1e-9)
+
+
+def test_cubo_temporal(agregados):
+    banco, referencia, _ = agregados
+    for grao, dimensao in (('D', None), ('W', 'Categoria'), ('M', 'Status_Pedido')):
+        pd.testing.assert_frame_equal(banco['cubo_tempo'].consultar(grao, dimensao),
+                                      referencia['cubo_tempo'].consultar(grao, dimensao),
+                                      check_dtype=False, check_names=False, check_index_type=False,
+                                      check_column_type=False)
+    assert banco['cubo_tempo'].periodo() == referencia['cubo_tempo'].periodo()
+
+
+def test_geografia(agregados):
+    banco, referencia, _ = agregados
+    geo_banco, geo_ref = banco['geografia'], referencia['geografia']
+    pd.testing.assert_frame_equal(geo_banco.estados(), geo_ref.estados(), check_dtype=False)
+    pd.testing.assert_frame_equal(geo_banco.por_cidade().sort_index(), geo_ref.por_cidade().sort_index(), check_dtype=False)
+    pd.testing.assert_frame_equal(geo_banco.por_prefixo(3), geo_ref.por_prefixo(3), check_dtype=False)
+    for prefixo in ('', '1', '40', '560'):
+        assert geo_banco.prefixo_cep(prefixo) == pytest.approx(geo_ref.prefixo_cep(prefixo))
+
+
+def test_top_produtos(agregados):
+    banco, referencia, _ = agregados
+    for dimensao in app.TopProdutos.DIMENSOES:
+        for medida in app.TopProdutos.MEDIDAS:
+            top_banco = banco['produtos'].consultar(dimensao, medida, 10)
+            top_ref = referencia['produtos'].consultar(dimensao, medida, 10)
+            np.testing.assert_allclose(top_banco['peso'], top_ref['peso'])
+            # Empates no peso podem aparecer em qualquer ordem
+            assert set(top_banco.index[top_banco['peso'] > top_banco['peso'].iloc[-1]]) == \
+                set(top_ref.index[top_ref['peso'] > top_ref['peso'].iloc[-1]])
+
+
+def test_efeito_promocoes(agregados):
+    banco, referencia, _ = agregados
+    efeitos_banco = banco['promocoes'].sort_index()
+    efeitos_ref = referencia['promocoes'].sort_index()
+    assert list(efeitos_banco.index) == list(efeitos_ref.index)
+    for coluna in ('pedidos', 'receita', 'media', 'diferenca', 'p_valor', 'p_holm'):
+        np.testing.assert_allclose(efeitos_banco[coluna], efeitos_ref[coluna], rtol=1e-9, err_msg=coluna)
@@ -0,0 +1,72 @@
+"""Grafo de etapas: ordem das dependências, propagação de erros e o pool compartilhado."""
+import threading
+import time
+
+import pytest
+
+import app
+
+
+def _registrar(eventos, nome, resultado):
+    """Etapa que anota início e fim (e a thread em que rodou) e devolve `resultado`; list.append é atômico"""
+    def funcao(*argumentos):
+        eventos.append(('inicio', nome, threading.current_thread().name, argumentos))
+        time.sleep(0.02)
+        eventos.append(('fim', nome))
+        return resultado(*argumentos)
+    return funcao
+
+
+def _posicao(eventos, tipo, nome):
+    return next(i for i, evento in enumerate(eventos) if evento[:2] == (tipo, nome))
+
+
+def test_diamante_respeita_as_dependencias():
+    eventos = []
+    grafo = (app.GrafoEtapas()
+        .etapa('d', _registrar(eventos, 'd', lambda b, c: (b, c)), 'b', 'c')
+        .etapa('b', _registrar(eventos, 'b', lambda a: a + 1), 'a')
+        .etapa('c', _registrar(eventos, 'c', lambda a: a * 10), 'a')
+        .etapa('a', _registrar(eventos, 'a', lambda: 1)))
+    resultados = grafo.executar()
+
+    # Os argumentos chegam na ordem declarada das dependências
+    assert resultados == {'a': 1, 'b': 2, 'c': 10, 'd': (2, 10)}
+    # 'a' roda uma única vez, antes de 'b' e 'c'; 'd' só depois das duas
+    assert [e[1] for e in eventos if e[0] == 'inicio'].count('a') == 1
+    for nome in ('b', 'c'):
+        assert _posicao(eventos, 'fim', 'a') < _posicao(eventos, 'inicio', nome) < _posicao(eventos, 'inicio', 'd')
+        assert _posicao(eventos, 'fim', nome) < _posicao(eventos, 'inicio', 'd')
+
+
+def test_pool_compartilhado():
+    # Sem `pool`, todas as execuções usam o mesmo pool do processo (st.cache_resource)
+    assert app.obter_pool_etapas() is app.obter_pool_etapas()
+    eventos = []
+    for _ in range(2):
+        app.GrafoEtapas().etapa('a', _registrar(eventos, 'a', lambda: None)).executar()
+    assert all(e[2].startswith('etapa') for e in eventos if e[0] == 'inicio')
+
+
+def test_erro_de_uma_etapa_sobe_para_quem_chamou():
+    eventos = []
+
+    def falhar(a):
+        raise KeyError('coluna ausente')
+
+    grafo = (app.GrafoEtapas()
+        .etapa('a', _registrar(eventos, 'a', lambda: 1))
+        .etapa('b', falhar, 'a')
+        .etapa('c', _registrar(eventos, 'c', lambda a: a), 'a')
+        .etapa('d', _registrar(eventos, 'd', lambda b, c: None), 'b', 'c'))
+    with pytest.raises(KeyError, match='coluna ausente'):
+        grafo.executar()
+    # A etapa que depende da que falhou nunca começa
+    assert not any(e[1] == 'd' for e in eventos)
+
+
+def test_dependencia_circular_ou_ausente():
+    with pytest.raises(ValueError, match='circulares ou ausentes'):
+        app.GrafoEtapas().etapa('a', lambda b: b, 'b').etapa('b', lambda a: a, 'a').executar()
+    with pytest.raises(ValueError, match='circulares ou ausentes'):
+        app.GrafoEtapas().etapa('a', lambda x: x, 'inexistente').executar()
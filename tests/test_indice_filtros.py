@@ -0,0 +1,103 @@
+"""Índice de filtros (bitmaps, tabela CSR das promoções e datas ordenadas) contra a filtragem do pandas."""
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import gerar_dados
+
+
+@pytest.fixture(scope='module')
+def pedidos():
+    return app.preparar_dados(gerar_dados.gerar_pedidos(4000, semente=21))
+
+
+@pytest.fixture(scope='module')
+def indice(pedidos):
+    return app.IndiceFiltros(pedidos)
+
+
+def _promocoes_da_linha(texto):
+    return {p.strip() for p in str(texto).split(',') if p.strip()} if pd.notna(texto) else set()
+
+
+def _posicoes(indice, filtros=None, periodo=None):
+    # linhas() e selecionar() devem descrever as mesmas linhas
+    linhas = indice.linhas(filtros, periodo)
+    bits = np.unpackbits(indice.selecionar(filtros, periodo), count=indice.n)
+    np.testing.assert_array_equal(np.flatnonzero(bits), linhas)
+    return linhas
+
+
+def test_sem_filtro(indice):
+    assert indice.selecionar() is None and indice.linhas({'Categoria': []}) is None
+
+
+def test_colunas_categoricas(pedidos, indice):
+    categorias = indice.valores('Categoria')[:2]
+    estados = indice.valores('Estado_Destino')[:3]
+    filtros = {'Categoria': categorias, 'Estado_Destino': estados, 'Venda_B2B': [False]}
+    esperado = pedidos['Categoria'].isin(categorias) & pedidos['Estado_Destino'].isin(estados) & ~pedidos['Venda_B2B']
+    np.testing.assert_array_equal(_posicoes(indice, filtros), np.flatnonzero(esperado))
+
+    # Valor inexistente não seleciona nada
+    assert len(_posicoes(indice, {'Categoria': ['(nenhuma)']})) == 0
+
+
+def test_promocoes_pela_tabela_csr(pedidos, indice):
+    escolhidas = set(indice.valores('IDs_Promocao')[::7])
+    esperado = pedidos['IDs_Promocao'].map(lambda texto: bool(_promocoes_da_linha(texto) & escolhidas))
+    np.testing.assert_array_equal(_posicoes(indice, {'IDs_Promocao': sorted(escolhidas)}), np.flatnonzero(esperado))
+
+    # Combinada com outra coluna: AND entre as colunas
+    status = indice.valores('Status_Pedido')[0]
+    filtros = {'IDs_Promocao': sorted(escolhidas), 'Status_Pedido': [status]}
+    np.testing.assert_array_equal(_posicoes(indice, filtros),
+                                  np.flatnonzero(esperado & (pedidos['Status_Pedido'] == status)))
+
+
+def test_periodo_fechado_em_dias(pedidos, indice):
+    inicio, fim = indice.periodo()
+    assert (inicio, fim) == (pedidos['Data_Pedido'].min().date(), pedidos['Data_Pedido'].max().date())
+    periodo = (inicio + datetime.timedelta(days=10), inicio + datetime.timedelta(days=20))
+    datas = pedidos['Data_Pedido']
+    esperado = (datas >= pd.Timestamp(periodo[0])) & (datas < pd.Timestamp(periodo[1]) + pd.Timedelta(days=1))
+    np.testing.assert_array_equal(_posicoes(indice, periodo=periodo), np.flatnonzero(esperado))
+
+    filtros = {'Tem_Promocao': [True]}
+    np.testing.assert_array_equal(_posicoes(indice, filtros, periodo),
+                                  np.flatnonzero(esperado & pedidos['Tem_Promocao']))
+
+
+def test_agregados_da_selecao_iguais_aos_completos(pedidos, indice):
+    posicoes = indice.linhas({'Categoria': indice.valores('Categoria')[:3]})
+    recorte = pedidos.iloc[posicoes]
+    completos = app.calcular_agregados(recorte)
+
+    base = app.calcular_agregados_base(pedidos, posicoes)
+    assert base == app.calcular_agregados_base(recorte)
+
+    partes = {parte: app.calcular_agregados_selecao(pedidos, posicoes, parte) for parte in
+              ('distribuicao', 'contagens', 'grupos', 'cubo_tempo', 'geografia', 'produtos', 'promocoes')}
+    assert partes['distribuicao']['estatisticas'] == pytest.approx(completos['estatisticas'], nan_ok=True)
+    assert partes['distribuicao']['ic_95'] == pytest.approx(completos['ic_95'])
+    for contagem in ('vendas_categoria', 'receita_categoria', 'status_pedidos'):
+        pd.testing.assert_series_equal(partes['contagens'][contagem], completos[contagem])
+    assert partes['grupos']['grupos'] == completos['grupos']
+    assert partes['grupos']['teste_b2b'] == pytest.approx(completos['teste_b2b'])
+    np.testing.assert_array_equal(partes['distribuicao']['histograma'][0], completos['histograma'][0])
+    caixas = {**partes['distribuicao']['caixas'], **partes['grupos']['caixas']}
+    assert caixas.keys() == completos['caixas'].keys()
+    assert caixas['b2b']['True']['mediana'] == completos['caixas']['b2b']['True']['mediana']
+
+    pd.testing.assert_frame_equal(partes['cubo_tempo']['cubo_tempo'].consultar('M', 'Categoria'),
+                                  completos['cubo_tempo'].consultar('M', 'Categoria'))
+    pd.testing.assert_frame_equal(partes['geografia']['geografia'].estados(), completos['geografia'].estados())
+    pd.testing.assert_frame_equal(partes['produtos']['produtos'].consultar('Estilo', 'valor'),
+                                  completos['produtos'].consultar('Estilo', 'valor'))
+    pd.testing.assert_frame_equal(partes['promocoes']['promocoes'], completos['promocoes'])
+
+    with pytest.raises(ValueError):
+        app.calcular_agregados_selecao(pedidos, posicoes, 'resumo')
@@ -0,0 +1,56 @@
+"""Instrumentação: acertos e faltas dos caches, etapas aninhadas e o log JSONL de cada execução."""
+import json
+
+import pytest
+import streamlit as st
+
+import app
+
+
+@pytest.fixture
+def instrumentacao(monkeypatch):
+    """Medição nova no lugar da global do módulo (o app cria uma a cada execução da página)"""
+    nova = app.Instrumentacao()
+    monkeypatch.setattr(app, 'INSTRUMENTACAO', nova)
+    return nova
+
+
+def test_segunda_chamada_e_acerto(instrumentacao):
+    chamadas = []
+
+    @app.cache_instrumentado(st.cache_data, max_entries=4)
+    def quadrado_instrumentado(x):
+        chamadas.append(x)
+        return x * x
+
+    quadrado_instrumentado.clear()
+    assert [quadrado_instrumentado(3), quadrado_instrumentado(3), quadrado_instrumentado(4)] == [9, 9, 16]
+    assert chamadas == [3, 4]
+    contagem = instrumentacao.cache['quadrado_instrumentado']
+    assert (contagem['acertos'], contagem['faltas']) == (1, 2)
+
+
+def test_log_jsonl_com_as_etapas(instrumentacao, pasta, monkeypatch):
+    caminho = pasta / 'instrumentacao.jsonl'
+    monkeypatch.setattr(app, 'CAMINHO_LOG_INSTRUMENTACAO', str(caminho))
+    monkeypatch.setattr(st, 'session_state', {})
+
+    with app.medir_etapa('carga'):
+        with app.medir_etapa('indice_filtros'):
+            pass
+    app.GrafoEtapas().etapa('histograma', lambda: None).executar()
+    instrumentacao.registrar_grafico('histograma', 1234, True, 0.01)
+    app.finalizar_instrumentacao()
+    # Uma execução isolada de fragmento grava a própria linha
+    monkeypatch.setattr(app, 'INSTRUMENTACAO', app.Instrumentacao('fragmento:secao_descritiva'))
+    with app.medir_etapa('secao_descritiva'):
+        pass
+    app.finalizar_instrumentacao()
+
+    primeira, segunda = [json.loads(linha) for linha in caminho.read_text(encoding='utf-8').splitlines()]
+    assert [e['etapa'] for e in primeira['etapas']] == ['carga/indice_filtros', 'carga', 'histograma']
+    assert primeira['escopo'] == 'pagina' and primeira['bytes_graficos'] == 1234
+    assert segunda['escopo'] == 'fragmento:secao_descritiva'
+    assert [e['etapa'] for e in segunda['etapas']] == ['secao_descritiva']
+    # O mesmo resumo fica no histórico da sessão (painel de depuração)
+    assert [r['escopo'] for r in st.session_state['historico_instrumentacao']] == ['pagina', 'fragmento:secao_descritiva']
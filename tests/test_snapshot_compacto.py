@@ -0,0 +1,27 @@
+"""Snapshot compacto: as colunas do DataFrame continuam apontando para os arquivos .npy mapeados."""
+import pandas as pd
+
+import app
+import gerar_dados
+
+
+def test_colunas_continuam_mapeadas(pasta):
+    gerar_dados.gravar_pedidos(str(pasta / 'pedidos.db'), 2000, semente=3)
+    fonte = app.abrir_fonte('sqlite:///pedidos.db')
+    df = app.carregar_snapshot_compacto(fonte, pasta='compacto')
+
+    # Várias colunas do mesmo dtype: consolidadas num bloco 2D, seriam copiadas para a memória
+    assert df.dtypes.duplicated().any()
+    assert app.colunas_fora_do_mapa(df) == []
+    # Filtrar linhas não altera o DataFrame mapeado
+    df.iloc[::2].sum(numeric_only=True)
+    assert app.colunas_fora_do_mapa(df) == []
+
+    # Uma cópia comum é detectada
+    assert app.colunas_fora_do_mapa(df.copy()) == list(df.columns)
+
+    # Mesmos valores que a leitura completa, a menos dos tipos reduzidos
+    completo = fonte.ler()
+    for nome in df.columns:
+        pd.testing.assert_series_equal(df[nome].astype(completo[nome].dtype), completo[nome],
+                                       check_names=False, check_categorical=False, check_exact=False)
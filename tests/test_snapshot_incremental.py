@@ -0,0 +1,100 @@
+"""Snapshot Parquet de um .xlsx: linhas acrescentadas viram uma parte nova, igual a uma releitura completa."""
+import pandas as pd
+from openpyxl import load_workbook
+
+import app
+import gerar_dados
+
+N_PEDIDOS = 1500
+
+
+def _acrescentar(caminho, novas):
+    """Acrescenta as linhas de `novas` ao fim da planilha (o openpyxl regrava o arquivo inteiro)"""
+    livro = load_workbook(caminho)
+    planilha = livro.worksheets[0]
+    for linha in novas.astype(object).where(novas.notna(), None).itertuples(index=False, name=None):
+        planilha.append(linha)
+    livro.save(caminho)
+
+
+def _releitura_completa(caminho):
+    return app.preparar_dados(pd.read_excel(caminho))
+
+
+def _comparar(snapshot, referencia):
+    # O snapshot guarda os tipos da primeira leitura; a coluna sempre vazia vem como objeto ou float
+    pd.testing.assert_frame_equal(snapshot.drop(columns='Unnamed: 22'), referencia.drop(columns='Unnamed: 22'),
+                                  check_dtype=False)
+
+
+def test_linhas_acrescentadas(pasta):
+    caminho = str(pasta / 'pedidos.xlsx')
+    gerar_dados.gravar_pedidos(caminho, N_PEDIDOS, semente=4)
+    primeiro = app.carregar_snapshot(caminho)
+    assert len(primeiro) == N_PEDIDOS
+
+    # Pedidos novos na data mais recente do arquivo (a marca d'água não recua)
+    novas = gerar_dados.gerar_pedidos(300, semente=5)[gerar_dados.COLUNAS]
+    novas['Data_Pedido'] = primeiro['Data_Pedido'].max()
+    _acrescentar(caminho, novas)
+
+    atualizado = app.carregar_snapshot(caminho)
+    meta = app._ler_meta_snapshot()
+    assert (meta['partes'], meta['linhas_anteriores'], meta['n_linhas']) == (2, N_PEDIDOS, N_PEDIDOS + 300)
+    referencia = _releitura_completa(caminho)
+    _comparar(atualizado, referencia)
+    # As partes no disco (sem o frame da memória) dão o mesmo resultado
+    _comparar(pd.read_parquet(app.CAMINHO_SNAPSHOT), referencia)
+
+
+def test_arquivo_editado_e_relido(pasta):
+    caminho = str(pasta / 'pedidos.xlsx')
+    gerar_dados.gravar_pedidos(caminho, N_PEDIDOS, semente=4)
+    app.carregar_snapshot(caminho)
+
+    # A última linha conhecida muda de lugar: não é só um acréscimo
+    livro = load_workbook(caminho)
+    livro.worksheets[0].delete_rows(2)
+    livro.save(caminho)
+
+    atualizado = app.carregar_snapshot(caminho)
+    assert app._ler_meta_snapshot()['partes'] == 1
+    _comparar(atualizado, _releitura_completa(caminho))
+
+
+def test_leitura_a_partir_da_linha(pasta):
+    caminho = str(pasta / 'pedidos.xlsx')
+    gerar_dados.gravar_pedidos(caminho, N_PEDIDOS, semente=6)
+    referencia = pd.read_excel(caminho)
+    recorte = pd.concat(app.ler_em_lotes(caminho, tamanho_lote=100, primeira_linha=1234), ignore_index=True)
+    assert len(recorte) == N_PEDIDOS - 1234
+    esperado = app.preparar_dados(referencia.iloc[1234:].reset_index(drop=True))
+    _comparar(recorte.infer_objects(), esperado)
+
+
+def test_load_data_serve_um_unico_frame(pasta, monkeypatch):
+    caminho = str(pasta / 'pedidos.xlsx')
+    gerar_dados.gravar_pedidos(caminho, N_PEDIDOS, semente=4)
+    monkeypatch.setattr(app, 'obter_fonte', lambda: app.FonteArquivo(caminho))
+    app._dados_em_memoria().update(versao=None, df=None)
+
+    versao = app.versao_dados(caminho)
+    primeiro = app.load_data(versao)
+    # Reruns e outras sessões recebem o mesmo objeto, sem desserializar uma cópia
+    assert app.load_data(versao) is primeiro
+
+    novas = gerar_dados.gerar_pedidos(200, semente=8)[gerar_dados.COLUNAS]
+    novas['Data_Pedido'] = primeiro['Data_Pedido'].max()
+    _acrescentar(caminho, novas)
+
+    def sem_releitura(*args, **kwargs):
+        raise AssertionError("a atualização deveria partir do frame em memória")
+
+    # O acréscimo parte do frame servido; as partes Parquet não são relidas
+    with monkeypatch.context() as m:
+        m.setattr(pd, 'read_parquet', sem_releitura)
+        atualizado = app.load_data(app.versao_dados(caminho))
+    assert len(atualizado) == N_PEDIDOS + 200
+    memoria = app._dados_em_memoria()
+    assert memoria['df'] is atualizado and memoria['versao'] == app.versao_dados(caminho)
+    _comparar(atualizado, _releitura_completa(caminho))